@@ -2,8 +2,8 @@
 # Licensed under the MIT License.
 
 import argparse
-from msccl.language import *
-from msccl.topologies import *
+from msccl.language import MSCCLProgram, Buffer, ThreadblockPolicy, chunk, XML, Check
+from msccl.topologies import fully_connected
 from msccl.language.collectives import AllReduce
 
 def allreduce_allpairs(gpus, instances, protocol):
@@ -19,31 +19,32 @@ def allreduce_allpairs(gpus, instances, protocol):
     with MSCCLProgram("allreduce_reduce_broadcast", topology, collective, instances, protocol=protocol, 
         interleaved_replication=False, threadblock_policy=ThreadblockPolicy.manual, dependence_nop=True):
         
-        # Each rank sends the nth chunk to the nth rank into its scratch space: chunk transpose operation
-        for r1 in range(size):  # Each GPU in system, sends chunks to some "pre-determined" set of reducer GPUs 
-            for r2 in range(rsize): # To all the reducer ranks (could be 1 or more - equal to #GPU)
-                if r1 != gpuIds[r2]:
-                    index = r2 * size # Index of the send chunk on source rank, destRankIndex X CopySize(#Chunks in 1 send cmd)
+        # Single pass over the reducer ranks: the transpose, reduction and broadcast for a
+        # reducer are emitted together; dependencies between them are tracked through chunk refs
+        for r2, gid in enumerate(gpuIds): # Go through all reducer ranks (== 1 <= #GPUs)
+            index = r2 * size # Index of the send chunk on source rank, destRankIndex X CopySize(#Chunks in 1 send cmd)
+            scratch_index = 0 # Where the next received chunks land in the reducer's scratch memory
+            for r1 in range(size):  # Each GPU in system, sends chunks to some "pre-determined" set of reducer GPUs
+                if r1 != gid:
+                    # Send the nth chunk to the nth rank into its scratch space: chunk transpose operation
                     c = chunk(r1, Buffer.input, index, size=size) # Reference to the Source chunk
-                    c.copy(gpuIds[r2], 'scratch', sendtb=gpuIds[r2], recvtb=r1)
-
-        # Each reducer rank performs a local reduction on the nth chunk
-        # Utilize 8 threadblocks for this reduction for better parallelism
-        for r in range(rsize): # Go through each reducer rank in the syste, and perform reduction on data (respective data + scratch memory)
-            for index in range(0, size * (size-1)): # Go through scratch memory, 0 to CopySize x #recieved chunks (== #GPU)
-                    c = chunk(gpuIds[r], Buffer.input, r*size + (index % size))  # Destination fragments (0..15) on given rank 
-                    c.reduce(chunk(gpuIds[r], 'scratch', index), sendtb=(index % size))
+                    c.copy(gid, 'scratch', sendtb=gid, recvtb=r1)
+
+                    # Reducer rank performs a local reduction of the received chunks into the nth chunk
+                    # Utilize 8 threadblocks for this reduction for better parallelism
+                    for i in range(size):
+                        c = chunk(gid, Buffer.input, index + i)  # Destination fragments (0..15) on given rank
+                        c.reduce(chunk(gid, 'scratch', scratch_index + i), sendtb=i)
                                     # other fragment in scratch memory - where chunks from other ranks are recieved
-        
-        # Each reducer rank sends the fully reduced nth chunk to all other gpus 
-        # Broadcast reduced chunk to other GPUs in the system
-        for r1 in range(rsize): # Go through all reducer ranks (== 1 <= #GPUs), source rank
-            for r2 in range(size):      # All destinations GPUs in the system
-                if gpuIds[r1] != r2:
-                    index = r1 * size  # ReducerRank X CopySize gives the index for source copy chunk
-                    c = chunk(gpuIds[r1], Buffer.input, index, size) # Source chunk
-                    c.copy(r2, Buffer.input, index, sendtb=r2, recvtb=gpuIds[r1]) # Destination chunk
-                
+                    scratch_index += size
+
+            # Reducer rank sends the fully reduced nth chunk to all other gpus
+            # Broadcast reduced chunk to other GPUs in the system
+            for r1 in range(size):      # All destinations GPUs in the system
+                if gid != r1:
+                    c = chunk(gid, Buffer.input, index, size) # Source chunk
+                    c.copy(r1, Buffer.input, index, sendtb=r1, recvtb=gid) # Destination chunk
+
         XML()
         Check()
 
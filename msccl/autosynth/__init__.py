@@ -3,14 +3,13 @@
 
 from msccl.topologies import dgx1, dgx_a100, nvlink_only
 from msccl.isomorphisms import find_isomorphisms
-from msccl.autosynth.registry import synthesis_plans
+from msccl.autosynth.registry import synthesis_plans, _write_tmp_file
 from lxml import etree as ET
 import re
 import subprocess
 import fcntl
 import os
 import math
-import tempfile
 import humanfriendly
 from tabulate import tabulate
 from enum import Enum
@@ -74,9 +73,13 @@ def init(machine_type, num_machines, *collectives):
     # Execute the plans to find or synthesize the algorithms and format them in the XML format expected by MSCCL-RT.
     algos_elem = ET.Element('msccl_algos')
     any_selected = False
+    # A plan may be selected for several disjoint size ranges, only run it once
+    plan_paths = {}
     for collective_name, plans in selected_plans.items():
         for plan, params in plans:
-            path = plan(num_machines)
+            if plan not in plan_paths:
+                plan_paths[plan] = plan(num_machines)
+            path = plan_paths[plan]
             load_elem = ET.SubElement(algos_elem, 'load')
             load_elem.set('path', path)
             minsize, maxsize, proto = params
@@ -89,9 +92,7 @@ def init(machine_type, num_machines, *collectives):
     ET.indent(algos_elem, space='  ')
         
     if any_selected:
-        fd, path = tempfile.mkstemp()
-        with os.fdopen(fd, 'w') as f:
-            f.write(ET.tostring(algos_elem, encoding='unicode'))
+        path = _write_tmp_file(ET.tostring(algos_elem, encoding='unicode'))
 
         # Set environment variables
         env = {
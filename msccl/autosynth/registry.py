@@ -6,6 +6,9 @@ import math
 import tempfile
 import os
 import atexit
+import hashlib
+import marshal
+import shutil
 import humanfriendly
 
 from msccl.language import MSCCLProgram, ir_to_xml
@@ -17,6 +20,77 @@ from msccl.topologies import distributed_fully_connected
 # (name, function, machines, size_range, protocol, priority).
 synthesis_plans = defaultdict(list)
 
+_tmpdir = None
+
+
+def _get_tmpdir():
+    # Holds files that only need to live as long as this process. The directory is
+    # removed in one go at exit, and only by the process that created it, so forked
+    # children exiting do not delete it from under their parent.
+    global _tmpdir
+    if _tmpdir is None:
+        _tmpdir = tempfile.mkdtemp(prefix='msccl_autosynth_')
+        atexit.register(_remove_tmpdir, _tmpdir, os.getpid())
+    return _tmpdir
+
+
+def _remove_tmpdir(path, pid):
+    if os.getpid() == pid:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _write_tmp_file(content):
+    fd, path = tempfile.mkstemp(dir=_get_tmpdir())
+    with os.fdopen(fd, 'w') as f:
+        f.write(content)
+    return path
+
+
+def _synthesis_cache_path(fun, machines):
+    # Results of plans registered with cache=True are kept across runs, keyed by the plan's
+    # code, the number of machines and the msccl sources. Set MSCCL_DISABLE_CACHE=1 to skip.
+    if os.environ.get('MSCCL_DISABLE_CACHE') == '1':
+        return None
+    key = hashlib.sha1(marshal.dumps(fun.__code__))
+    key.update(f'|{fun.__module__}.{fun.__qualname__}|{machines}|{_msccl_source_digest()}'.encode('utf-8'))
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'msccl', f'{key.hexdigest()}.xml')
+
+
+_source_digest = None
+
+
+def _msccl_source_digest():
+    # Plans call into solvers, distributors and ncclize, so any change to the package
+    # invalidates cached results. Computed once per process.
+    global _source_digest
+    if _source_digest is None:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        digest = hashlib.sha1()
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith('.py'):
+                    path = os.path.join(dirpath, filename)
+                    digest.update(os.path.relpath(path, root).encode('utf-8'))
+                    with open(path, 'rb') as f:
+                        digest.update(f.read())
+        _source_digest = digest.hexdigest()
+    return _source_digest
+
+
+def _write_cached_ef(ef, path):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w') as f:
+            f.write(ef)
+        os.replace(tmp_path, path)
+    except OSError:
+        # Cache directory is not writable, fall back to a temporary file
+        return _write_tmp_file(ef)
+    return path
+
 
 def _register_ef_provider(desc, fun, collective, machine_type, machines, sizes, protocol, priority):
     if sizes == None:
@@ -46,15 +120,17 @@ def register_ef_file(path, collective, machine_type, num_machines, sizes=None, p
                          machine_type, lambda x: x == num_machines, sizes, protocol, priority)
 
 
-def register_synthesis_plan(collective, machine_type, machines=lambda x: True, sizes=None, protocol='Simple', priority=0):
+def register_synthesis_plan(collective, machine_type, machines=lambda x: True, sizes=None, protocol='Simple', priority=0, cache=False):
+    # Only plans whose output depends on nothing but the number of machines may set cache=True
     def decorator(fun):
         def wrapped(machines):
+            cache_path = _synthesis_cache_path(fun, machines) if cache else None
+            if cache_path is not None and os.path.exists(cache_path):
+                return cache_path
             ef = fun(machines)
-            fd, path = tempfile.mkstemp()
-            with os.fdopen(fd, 'w') as f:
-                f.write(ef)
-            atexit.register(os.remove, path)
-            return path
+            if cache_path is not None:
+                return _write_cached_ef(ef, cache_path)
+            return _write_tmp_file(ef)
         _register_ef_provider(f'call {fun.__name__}', wrapped, collective,
                              machine_type, machines, sizes, protocol, priority)
         # Return the original function to not break other usage
@@ -87,11 +163,7 @@ def register_msccl_program(local_topology, collective, machine_type, machines=la
                 fun(prog, machines)
             prog.check()
             ef = prog.generate_xml()
-            fd, path = tempfile.mkstemp()
-            with os.fdopen(fd, 'w') as f:
-                f.write(ef)
-            atexit.register(os.remove, path)
-            return path
+            return _write_tmp_file(ef)
         _register_ef_provider(f'run {name}', wrapped, collective,
                              machine_type, machines, sizes, protocol, priority)
         # Return the original function to not break other usage
@@ -5,6 +5,10 @@ from .topology import Topology
 
 from fractions import Fraction
 import subprocess
+import tempfile
+import fcntl
+import stat
+import os
 
 def dgx1():
     # (0 1 2 3) (4 5 6 7) are two sockets
@@ -54,22 +58,80 @@ def nvlink_only(nvidia_smi_topo=None):
     return Topology('NVLinkOnly', links)
 
 def _get_nvidia_smi_topo():
-    output = subprocess.check_output("nvidia-smi topo -m".split())
-    return output.decode("utf-8")
+    # Every local rank asks for the same output and concurrent nvidia-smi calls
+    # contend on NVML, so cache the output per user for the current boot. Any
+    # problem with the cache is treated as a miss and nvidia-smi is run directly.
+    output = _read_cached_nvidia_smi_topo()
+    if output is None:
+        output = _run_nvidia_smi_topo()
+    return output
+
+def _read_cached_nvidia_smi_topo():
+    # Returns the cached output, filling the cache under a lock on a miss, or None if
+    # the cache can not be used
+    try:
+        path = _nvidia_smi_topo_cache_path()
+        output = _read_own_file(path)
+        if output is not None:
+            return output
+        fd = os.open(f'{path}.lock', os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+    except OSError:
+        return None
+    with os.fdopen(fd, 'r+') as lock:
+        try:
+            if os.fstat(fd).st_uid != os.getuid():
+                return None
+            fcntl.lockf(lock, fcntl.LOCK_EX)
+            # Another rank may have populated the cache while we waited
+            output = _read_own_file(path)
+        except OSError:
+            return None
+        # Closing the lock file releases the lock, including when nvidia-smi fails
+        if output is None:
+            output = _run_nvidia_smi_topo()
+            try:
+                tmp_fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+                with os.fdopen(tmp_fd, 'w') as f:
+                    f.write(output)
+                os.replace(tmp_path, path)
+            except OSError:
+                pass
+        return output
+
+def _nvidia_smi_topo_cache_path():
+    # Ranks of a job share the boot and the mount namespace, while jobs in different
+    # containers on the same boot, which may see different GPUs, do not
+    with open('/proc/sys/kernel/random/boot_id') as f:
+        boot_id = f.read().strip()
+    cache_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(cache_dir, f'msccl_nvidia_smi_topo.{os.getuid()}.{boot_id}.{_mount_namespace()}')
+
+def _mount_namespace():
+    return os.stat('/proc/self/ns/mnt').st_ino
+
+def _read_own_file(path):
+    # Only trust regular files owned by the current user
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW)
+    except FileNotFoundError:
+        return None
+    with os.fdopen(fd) as f:
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode) or st.st_uid != os.getuid():
+            return None
+        return f.read()
+
+def _run_nvidia_smi_topo():
+    return subprocess.check_output("nvidia-smi topo -m".split(), encoding="utf-8")
 
 def _parse_nvidia_smi_topo(output):
-    lines = output.splitlines()
-    before_legend = []
-    for l in lines[1:]:
-        if l and l.startswith("GPU"):
-            # Only look at the rows for GPU
-            before_legend.append(l)
-        else:
+    # Single pass over the rows for GPU, splitting each row only once
+    matrix = []
+    for l in output.splitlines()[1:]:
+        if not l.startswith("GPU"):
             break
-    devices = [x.split("\t")[0] for x in before_legend]
-    gpus = [i for i in range(len(before_legend))
-            if before_legend[i].startswith("GPU")]
-    matrix = [x.split("\t")[1:] for x in before_legend]
+        matrix.append(l.split("\t")[1:])
+    gpus = range(len(matrix))
     nvlink_matrix = [[_nvlink_num(x[g]) for g in gpus] for x in matrix]
     return nvlink_matrix
 
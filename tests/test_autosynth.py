@@ -4,10 +4,13 @@
 import pytest
 import msccl
 import os
-from msccl.autosynth.registry import register_synthesis_plan
+import msccl.autosynth.registry as registry
+from msccl.autosynth.registry import register_synthesis_plan, synthesis_plans
+from msccl.autosynth.registry import _write_tmp_file, _get_tmpdir, _remove_tmpdir
 
 
-def test_msccl_init(capsys):
+def test_msccl_init(capsys, tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
     msccl.init('not_a_machine_type', 4, ('alltoall', 0))
     out, err = capsys.readouterr()
     assert 'No plan found' in out
@@ -43,3 +46,83 @@ def test_register_plan():
     @register_synthesis_plan('allgather', ['m1', 'm2'], sizes=[(0, '4MB'), ('1GiB', None)])
     def dummy_plan(m, s):
         pass
+
+
+def test_write_tmp_file():
+    path = _write_tmp_file('<algo name="test_write_tmp_file"/>')
+    assert os.path.dirname(path) == _get_tmpdir()
+    with open(path) as f:
+        assert f.read() == '<algo name="test_write_tmp_file"/>'
+
+
+def test_synthesis_cache(tmp_path, monkeypatch):
+    cache_home = tmp_path / 'cache'
+    monkeypatch.setenv('XDG_CACHE_HOME', str(cache_home))
+    calls = []
+
+    @register_synthesis_plan('allgather', 'cached_machine', cache=True)
+    def cached_plan(machines):
+        calls.append(machines)
+        return f'<algo machines="{machines}"/>'
+
+    wrapped = synthesis_plans[('allgather', 'cached_machine')][-1][1]
+    path = wrapped(2)
+    assert path.startswith(str(cache_home))
+    assert wrapped(2) == path
+    assert calls == [2]
+    assert wrapped(3) != path
+    assert calls == [2, 3]
+
+    # Changes to the msccl sources invalidate cached results
+    monkeypatch.setattr(registry, '_source_digest', 'changed')
+    assert wrapped(2) != path
+    assert calls == [2, 3, 2]
+
+    monkeypatch.setenv('MSCCL_DISABLE_CACHE', '1')
+    assert not wrapped(2).startswith(str(cache_home))
+    assert calls == [2, 3, 2, 2]
+
+
+def test_closure_plans_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+
+    def register(machine_type, proto):
+        @register_synthesis_plan('allgather', machine_type, protocol=proto)
+        def closure_plan(machines):
+            return f'<algo proto="{proto}"/>'
+
+    register('closure_machine1', 'Simple')
+    register('closure_machine2', 'LL')
+    for machine_type, proto in [('closure_machine1', 'Simple'), ('closure_machine2', 'LL')]:
+        wrapped = synthesis_plans[('allgather', machine_type)][-1][1]
+        with open(wrapped(1)) as f:
+            assert f.read() == f'<algo proto="{proto}"/>'
+    assert not os.path.exists(tmp_path / 'msccl')
+
+
+def test_plan_runs_once(monkeypatch):
+    monkeypatch.setenv('MSCCL_DISABLE_CACHE', '1')
+    calls = []
+
+    @register_synthesis_plan('allgather', 'split_machine')
+    def outer_plan(machines):
+        calls.append(machines)
+        return '<algo name="outer"/>'
+
+    @register_synthesis_plan('allgather', 'split_machine', sizes=('1KB', '1MB'), priority=1)
+    def inner_plan(machines):
+        return '<algo name="inner"/>'
+
+    msccl.init('split_machine', 1, ('allgather', (0, None)))
+    with open(os.environ['MSCCL_CONFIG']) as f:
+        assert f.read().count('<load') == 3
+    assert calls == [1]
+
+
+def test_tmpdir_removed_by_owner_only(tmp_path):
+    path = tmp_path / 'msccl_autosynth_test'
+    path.mkdir()
+    _remove_tmpdir(str(path), os.getpid() + 1)
+    assert path.exists()
+    _remove_tmpdir(str(path), os.getpid())
+    assert not path.exists()
@@ -2,6 +2,9 @@
 # Licensed under the MIT License.
 
 from msccl.topologies import *
+import msccl.topologies.nvidia as nvidia
+import os
+import pytest
 
 def test_local_topologies():
     assert hub_and_spoke(4) != None
@@ -48,3 +51,48 @@ Legend:
     topo = nvlink_only(dgx1_topo)
     assert topo != None
     assert topo.num_nodes() == 8
+
+def test_nvidia_smi_topo_cache(tmp_path, monkeypatch):
+    calls = []
+    def fake_run():
+        calls.append(None)
+        return 'GPU0\tGPU1\n'
+    monkeypatch.setattr(nvidia, '_run_nvidia_smi_topo', fake_run)
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    monkeypatch.setattr(nvidia.tempfile, 'tempdir', str(tmp_path))
+    assert nvidia._get_nvidia_smi_topo() == 'GPU0\tGPU1\n'
+    assert nvidia._get_nvidia_smi_topo() == 'GPU0\tGPU1\n'
+    assert len(calls) == 1
+
+    # Processes in another mount namespace, e.g. another container, do not share the cache
+    mnt_ns = nvidia._mount_namespace()
+    monkeypatch.setattr(nvidia, '_mount_namespace', lambda: mnt_ns + 1)
+    assert nvidia._get_nvidia_smi_topo() == 'GPU0\tGPU1\n'
+    assert len(calls) == 2
+    monkeypatch.setattr(nvidia, '_mount_namespace', lambda: mnt_ns)
+
+    # A cache entry that is not a regular file is not trusted
+    path = nvidia._nvidia_smi_topo_cache_path()
+    os.remove(path)
+    poisoned = tmp_path / 'poisoned'
+    poisoned.write_text('GPU0\n')
+    os.symlink(poisoned, path)
+    assert nvidia._get_nvidia_smi_topo() == 'GPU0\tGPU1\n'
+    assert len(calls) == 3
+
+    # An unusable cache location falls back to running nvidia-smi
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path / 'missing'))
+    assert nvidia._get_nvidia_smi_topo() == 'GPU0\tGPU1\n'
+    assert len(calls) == 4
+
+def test_nvidia_smi_topo_missing(tmp_path, monkeypatch):
+    calls = []
+    def fake_run():
+        calls.append(None)
+        raise FileNotFoundError('nvidia-smi')
+    monkeypatch.setattr(nvidia, '_run_nvidia_smi_topo', fake_run)
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    monkeypatch.setattr(nvidia.tempfile, 'tempdir', str(tmp_path))
+    with pytest.raises(FileNotFoundError):
+        nvidia._get_nvidia_smi_topo()
+    assert len(calls) == 1